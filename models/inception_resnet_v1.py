@@ -1,4 +1,7 @@
+import copy
+import itertools
 import os
+import zipfile
 
 import requests
 import torch
@@ -6,13 +9,14 @@ from nnt import log
 from requests.adapters import HTTPAdapter
 from torch import nn
 from torch.nn import functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 from .utils.download import download_url_to_file
 
 
 class BasicConv2d(nn.Module):
 
-    def __init__(self, in_planes, out_planes, kernel_size, stride, padding=0):
+    def __init__(self, in_planes, out_planes, kernel_size, stride, padding=0, groups=1):
         # NOTE: padding "same" can be used only when stride==1 https://github.com/pytorch/pytorch/issues/67551
         super().__init__()
         self.conv = nn.Conv2d(
@@ -21,6 +25,7 @@ class BasicConv2d(nn.Module):
             kernel_size=kernel_size,
             stride=stride,
             padding=padding,
+            groups=groups,
             bias=False,
         )  # verify bias false
         self.bn = nn.BatchNorm2d(
@@ -29,13 +34,136 @@ class BasicConv2d(nn.Module):
             momentum=0.1,  # default pytorch value
             affine=True,
         )
-        self.relu = nn.ReLU(inplace=False)
 
     def forward(self, x):
         x = self.conv(x)
         x = self.bn(x)
-        x = self.relu(x)
-        return x
+        # The pre-activation tensor is not reused, so ReLU can overwrite it
+        return F.relu(x, inplace=True)
+
+    def _fuse_for_inference(self):
+        """Fold the batch norm running statistics into the convolution weights and bias.
+
+        The batch norm layer is replaced by an identity, so the forward pass becomes a single
+        biased convolution followed by ReLU. Only valid in eval mode. Use
+        `InceptionResnetV1.fuse_for_inference`, which also releases any captured CUDA graph.
+        """
+        if self.training:
+            raise RuntimeError("BasicConv2d can only be fused for inference in eval mode")
+        if isinstance(self.bn, nn.BatchNorm2d):
+            self.conv = fuse_conv_bn_eval(self.conv, self.bn)
+            self.bn = nn.Identity()
+        return self
+
+
+_BASIC_CONV2D_KEYS = ("conv.weight", "bn.weight", "bn.bias", "bn.running_mean", "bn.running_var")
+
+
+def _remap_legacy_block(state_dict, prefix, merges, renames):
+    """Convert a block state_dict saved before its parallel branch convs were merged.
+
+    For each entry of `merges`, the parameters of the old BasicConv2d modules are concatenated
+    along the output channel dimension into the new (possibly grouped) BasicConv2d. The layers
+    in `renames` are moved to their new names. The state_dict is modified in place; it is left
+    untouched if it already uses the merged layout.
+
+    Arguments:
+        state_dict {dict} -- State dict being loaded.
+        prefix {str} -- Prefix of the block's keys in the state dict.
+        merges {dict} -- Mapping of new module names to lists of old module names.
+        renames {dict} -- Mapping of old module names to new module names.
+    """
+    if prefix + next(iter(merges.values()))[0] + ".conv.weight" not in state_dict:
+        return
+    for merged, old_names in merges.items():
+        for key in _BASIC_CONV2D_KEYS:
+            parts = [state_dict.pop(f"{prefix}{old}.{key}") for old in old_names]
+            state_dict[f"{prefix}{merged}.{key}"] = torch.cat(parts)
+        tracked = [state_dict.pop(f"{prefix}{old}.bn.num_batches_tracked", None) for old in old_names]
+        if tracked[0] is not None:
+            state_dict[f"{prefix}{merged}.bn.num_batches_tracked"] = tracked[0]
+    moved = {}
+    for old, new in renames.items():
+        for key in [k for k in state_dict if k.startswith(f"{prefix}{old}.")]:
+            moved[prefix + new + key[len(prefix + old):]] = state_dict.pop(key)
+    state_dict.update(moved)
+
+
+def _run_branches(branches, inputs, streams=None):
+    """Apply each branch to its input, concurrently on separate CUDA streams if given.
+
+    Without streams, or for CPU inputs, the branches run one after another on the current stream.
+    """
+    if streams is None or not inputs[0].is_cuda:
+        return [branch(x) for branch, x in zip(branches, inputs)]
+    current = torch.cuda.current_stream(inputs[0].device)
+    outputs = []
+    for branch, x, stream in zip(branches, inputs, streams):
+        stream.wait_stream(current)
+        with torch.cuda.stream(stream):
+            outputs.append(branch(x))
+    for stream, out in zip(streams, outputs):
+        current.wait_stream(stream)
+        # Outputs were allocated on a side stream but are consumed on the current one
+        out.record_stream(current)
+    return outputs
+
+
+def _scale_add_relu(out: torch.Tensor, x: torch.Tensor, scale: float) -> torch.Tensor:
+    return torch.relu(out * scale + x)
+
+
+def _scale_add(out: torch.Tensor, x: torch.Tensor, scale: float) -> torch.Tensor:
+    return out * scale + x
+
+
+# Scripted so that the residual scale, add and ReLU run as one fused elementwise kernel
+_scale_add_relu_fused = torch.jit.script(_scale_add_relu)
+_scale_add_fused = torch.jit.script(_scale_add)
+
+# Set while `InceptionResnetV1.quantize` traces the model with FX, which can neither trace into
+# TorchScript nor should bake buffer reuse into the graph
+_fx_tracing = False
+
+
+def _residual(out, x, scale, relu=True):
+    """Compute the residual tail `relu(out * scale + x)` of the Inception-ResNet blocks."""
+    if _fx_tracing:
+        # FX cannot trace into TorchScript, so use the plain Python ops
+        return _scale_add_relu(out, x, scale) if relu else _scale_add(out, x, scale)
+    return _scale_add_relu_fused(out, x, scale) if relu else _scale_add_fused(out, x, scale)
+
+
+def _cat_channels(module, tensors):
+    """Concatenate `tensors` along the channel dimension, reusing the module's buffer if enabled.
+
+    With `module.reuse_cat_buffer` set and gradients disabled, the result is written into a tensor
+    kept on the module, which is only reallocated when the output shape changes. That tensor is
+    overwritten by the module's next call, so the result must not escape the module's forward.
+
+    The buffer is not used during CUDA graph capture: it lives outside the graph's memory pool
+    and may be reallocated later, which would leave the graph writing into freed memory.
+    """
+    first = tensors[0]
+    if (
+        not module.reuse_cat_buffer
+        or torch.is_grad_enabled()
+        or _fx_tracing
+        or (first.is_cuda and torch.cuda.is_current_stream_capturing())
+    ):
+        return torch.cat(tensors, 1)
+    shape = (first.shape[0], sum(t.shape[1] for t in tensors)) + tuple(first.shape[2:])
+    buffer = module._cat_buffer
+    if (
+        buffer is None
+        or buffer.shape != shape
+        or buffer.dtype != first.dtype
+        or buffer.device != first.device
+        or buffer.is_inference() != torch.is_inference_mode_enabled()
+    ):
+        buffer = torch.empty(shape, dtype=first.dtype, device=first.device, memory_format=torch.channels_last)
+        module._cat_buffer = buffer
+    return torch.cat(tensors, 1, out=buffer)
 
 
 class Block35(nn.Module):
@@ -45,31 +173,38 @@ class Block35(nn.Module):
 
         self.scale = scale
 
-        self.branch0 = BasicConv2d(256, 32, kernel_size=1, stride=1)
+        # 1x1 reductions of branch0, branch1 and branch2 computed by a single conv
+        self.branch_1x1 = BasicConv2d(256, 96, kernel_size=1, stride=1)
 
-        self.branch1 = nn.Sequential(
-            BasicConv2d(256, 32, kernel_size=1, stride=1),
-            BasicConv2d(32, 32, kernel_size=3, stride=1, padding=1),
-        )
+        # First 3x3 convs of branch1 and branch2 computed by a single grouped conv
+        self.branch_3x3 = BasicConv2d(64, 64, kernel_size=3, stride=1, padding=1, groups=2)
 
-        self.branch2 = nn.Sequential(
-            BasicConv2d(256, 32, kernel_size=1, stride=1),
-            BasicConv2d(32, 32, kernel_size=3, stride=1, padding=1),
-            BasicConv2d(32, 32, kernel_size=3, stride=1, padding=1),
-        )
+        # Second 3x3 conv of branch2
+        self.branch2_3x3 = BasicConv2d(32, 32, kernel_size=3, stride=1, padding=1)
 
         self.conv2d = nn.Conv2d(96, 256, kernel_size=1, stride=1)
-        self.relu = nn.ReLU(inplace=False)
+        self.reuse_cat_buffer = False
+        self._cat_buffer = None
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        _remap_legacy_block(
+            state_dict,
+            prefix,
+            merges={
+                "branch_1x1": ["branch0", "branch1.0", "branch2.0"],
+                "branch_3x3": ["branch1.1", "branch2.1"],
+            },
+            renames={"branch2.2": "branch2_3x3"},
+        )
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
     def forward(self, x):
-        x0 = self.branch0(x)
-        x1 = self.branch1(x)
-        x2 = self.branch2(x)
-        out = torch.cat((x0, x1, x2), 1)
+        x0, x12 = torch.split(self.branch_1x1(x), (32, 64), dim=1)
+        x1, x2 = torch.split(self.branch_3x3(x12), (32, 32), dim=1)
+        x2 = self.branch2_3x3(x2)
+        out = _cat_channels(self, (x0, x1, x2))
         out = self.conv2d(out)
-        out = out * self.scale + x
-        out = self.relu(out)
-        return out
+        return _residual(out, x, self.scale)
 
 
 class Block17(nn.Module):
@@ -79,25 +214,33 @@ class Block17(nn.Module):
 
         self.scale = scale
 
-        self.branch0 = BasicConv2d(896, 128, kernel_size=1, stride=1)
+        # 1x1 reductions of branch0 and branch1 computed by a single conv
+        self.branch_1x1 = BasicConv2d(896, 256, kernel_size=1, stride=1)
 
         self.branch1 = nn.Sequential(
-            BasicConv2d(896, 128, kernel_size=1, stride=1),
             BasicConv2d(128, 128, kernel_size=(1, 7), stride=1, padding=(0, 3)),
             BasicConv2d(128, 128, kernel_size=(7, 1), stride=1, padding=(3, 0)),
         )
 
         self.conv2d = nn.Conv2d(256, 896, kernel_size=1, stride=1)
-        self.relu = nn.ReLU(inplace=False)
+        self.reuse_cat_buffer = False
+        self._cat_buffer = None
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        _remap_legacy_block(
+            state_dict,
+            prefix,
+            merges={"branch_1x1": ["branch0", "branch1.0"]},
+            renames={"branch1.1": "branch1.0", "branch1.2": "branch1.1"},
+        )
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
     def forward(self, x):
-        x0 = self.branch0(x)
-        x1 = self.branch1(x)
-        out = torch.cat((x0, x1), 1)
+        x0, x1 = torch.split(self.branch_1x1(x), (128, 128), dim=1)
+        x1 = self.branch1(x1)
+        out = _cat_channels(self, (x0, x1))
         out = self.conv2d(out)
-        out = out * self.scale + x
-        out = self.relu(out)
-        return out
+        return _residual(out, x, self.scale)
 
 
 class Block8(nn.Module):
@@ -108,27 +251,33 @@ class Block8(nn.Module):
         self.scale = scale
         self.noReLU = noReLU
 
-        self.branch0 = BasicConv2d(1792, 192, kernel_size=1, stride=1)
+        # 1x1 reductions of branch0 and branch1 computed by a single conv
+        self.branch_1x1 = BasicConv2d(1792, 384, kernel_size=1, stride=1)
 
         self.branch1 = nn.Sequential(
-            BasicConv2d(1792, 192, kernel_size=1, stride=1),
             BasicConv2d(192, 192, kernel_size=(1, 3), stride=1, padding=(0, 1)),
             BasicConv2d(192, 192, kernel_size=(3, 1), stride=1, padding=(1, 0)),
         )
 
         self.conv2d = nn.Conv2d(384, 1792, kernel_size=1, stride=1)
-        if not self.noReLU:
-            self.relu = nn.ReLU(inplace=False)
+        self.reuse_cat_buffer = False
+        self._cat_buffer = None
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        _remap_legacy_block(
+            state_dict,
+            prefix,
+            merges={"branch_1x1": ["branch0", "branch1.0"]},
+            renames={"branch1.1": "branch1.0", "branch1.2": "branch1.1"},
+        )
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
     def forward(self, x):
-        x0 = self.branch0(x)
-        x1 = self.branch1(x)
-        out = torch.cat((x0, x1), 1)
+        x0, x1 = torch.split(self.branch_1x1(x), (192, 192), dim=1)
+        x1 = self.branch1(x1)
+        out = _cat_channels(self, (x0, x1))
         out = self.conv2d(out)
-        out = out * self.scale + x
-        if not self.noReLU:
-            out = self.relu(out)
-        return out
+        return _residual(out, x, self.scale, relu=not self.noReLU)
 
 
 class Mixed_6a(nn.Module):
@@ -145,11 +294,10 @@ class Mixed_6a(nn.Module):
         )
 
         self.branch2 = nn.MaxPool2d(3, stride=2)
+        self.branch_streams = None
 
     def forward(self, x):
-        x0 = self.branch0(x)
-        x1 = self.branch1(x)
-        x2 = self.branch2(x)
+        x0, x1, x2 = _run_branches((self.branch0, self.branch1, self.branch2), (x,) * 3, self.branch_streams)
         out = torch.cat((x0, x1, x2), 1)
         return out
 
@@ -176,12 +324,12 @@ class Mixed_7a(nn.Module):
         )
 
         self.branch3 = nn.MaxPool2d(3, stride=2)
+        self.branch_streams = None
 
     def forward(self, x):
-        x0 = self.branch0(x)
-        x1 = self.branch1(x)
-        x2 = self.branch2(x)
-        x3 = self.branch3(x)
+        x0, x1, x2, x3 = _run_branches(
+            (self.branch0, self.branch1, self.branch2, self.branch3), (x,) * 4, self.branch_streams
+        )
         out = torch.cat((x0, x1, x2, x3), 1)
         return out
 
@@ -220,6 +368,11 @@ class InceptionResnetV1(nn.Module):
         self.classify = classify
         self.num_classes = num_classes
         tmp_classes = None # just to calm down pylint
+        self._graph = None
+        self._static_input = None
+        self._static_output = None
+        self._copy_stream = None
+        self._reduced_dtype = None
 
         if pretrained == "vggface2":
             tmp_classes = 8631
@@ -249,7 +402,6 @@ class InceptionResnetV1(nn.Module):
         self.mixed_7a = Mixed_7a()
         self.repeat_3 = self._create_sequential(repeat=5, BlockType=Block8, scale=0.20)
         self.block8 = Block8(noReLU=True)
-        self.avgpool_1a = nn.AdaptiveAvgPool2d(1)
         self.dropout = nn.Dropout(dropout_prob)
         self.last_linear = nn.Linear(1792, 512, bias=False)
         self.last_bn = nn.BatchNorm1d(512, eps=0.001, momentum=0.1, affine=True)
@@ -264,6 +416,9 @@ class InceptionResnetV1(nn.Module):
         if self.classify and self.num_classes is not None:
             self.logits = nn.Linear(512, self.num_classes)
 
+        # NHWC conv weights let cuDNN/oneDNN use their channels_last (Tensor Core) kernels
+        self.to(memory_format=torch.channels_last)
+
         self.device = torch.device("cpu")
         if device is not None:
             self.device = device
@@ -275,12 +430,28 @@ class InceptionResnetV1(nn.Module):
     def forward(self, x):
         """Calculate embeddings or logits given a batch of input image tensors.
 
+        If a CUDA graph has been captured with `capture_graph` and the input matches its shape,
+        dtype and device, the graph is replayed instead of running the layers one by one.
+
         Arguments:
             x {torch.tensor} -- Batch of image tensors representing faces.
 
         Returns:
             torch.tensor -- Batch of embedding vectors or multinomial logits.
         """
+        if self._copy_stream is not None and x.is_cuda:
+            # Wait for any input copies started by `preprocess_async`
+            torch.cuda.current_stream(x.device).wait_stream(self._copy_stream)
+        if self._graph is not None and self._graph_matches(x):
+            self._static_input.copy_(x)
+            self._graph.replay()
+            return self._static_output.clone()
+        return self._forward(x)
+
+    def _forward(self, x):
+        if self._reduced_dtype is not None:
+            x = x.to(self._reduced_dtype)
+        x = x.contiguous(memory_format=torch.channels_last)
         x = self.conv2d_1a(x)
         x = self.conv2d_2a(x)
         x = self.conv2d_2b(x)
@@ -294,9 +465,12 @@ class InceptionResnetV1(nn.Module):
         x = self.mixed_7a(x)
         x = self.repeat_3(x)
         x = self.block8(x)
-        x = self.avgpool_1a(x)
+        # Global average pool as a single reduction straight to (batch, channels)
+        x = x.mean(dim=(2, 3))
         x = self.dropout(x)
-        x = self.last_linear(x.view(x.shape[0], -1))
+        if self._reduced_dtype is not None:
+            x = x.float()
+        x = self.last_linear(x)
         x = self.last_bn(x)
         if self.classify:
             x = self.logits(x)
@@ -304,6 +478,314 @@ class InceptionResnetV1(nn.Module):
             x = F.normalize(x, p=2, dim=1)
         return x
 
+    @torch.no_grad()
+    def embed_batch(self, images, batch_size=32):
+        """Calculate embeddings for a list of face image tensors, batching them for throughput.
+
+        Images are grouped by shape, stacked into batches of at most `batch_size` and passed
+        through the model together, which keeps the GPU far better utilized than one forward pass
+        per face. Each batch is copied to the model's device with `preprocess_async` while the
+        previous batch is being processed. The model should be in eval mode.
+
+        Arguments:
+            images {list} -- Image tensors of shape (3, H, W), e.g. faces cropped by MTCNN.
+
+        Keyword Arguments:
+            batch_size {int} -- Maximum number of images per forward pass. (default: {32})
+
+        Returns:
+            list -- Embedding vectors (or logits if `classify` is set), in the order of `images`.
+        """
+        groups = {}
+        for i, image in enumerate(images):
+            groups.setdefault(tuple(image.shape), []).append(i)
+        batches = [
+            inds[start:start + batch_size]
+            for inds in groups.values()
+            for start in range(0, len(inds), batch_size)
+        ]
+
+        pin = torch.device(self.device).type == "cuda"
+
+        def load(batch):
+            tensors = [images[i] for i in batch]
+            if not pin or tensors[0].is_cuda:
+                return self.preprocess_async(torch.stack(tensors))
+            # Stack straight into pinned memory so that the batch is only copied once on the host
+            out = torch.empty(
+                (len(tensors),) + tuple(tensors[0].shape), dtype=tensors[0].dtype, pin_memory=True
+            )
+            return self.preprocess_async(torch.stack(tensors, out=out))
+
+        outputs = [None] * len(images)
+        if not batches:
+            return outputs
+        x = load(batches[0])
+        for b, batch in enumerate(batches):
+            out = self(x)
+            if b + 1 < len(batches):
+                x = load(batches[b + 1])
+            for i, o in zip(batch, out):
+                outputs[i] = o
+        return outputs
+
+    def to_bfloat16(self):
+        """Convert the model to bfloat16, keeping the embedding head in float32.
+
+        Halves the memory traffic of the convolutional body and enables Tensor Core kernels on
+        GPUs that support them. bfloat16 keeps the float32 exponent range, so it is preferred
+        over `to_half` for the batch norm statistics. Inputs are cast automatically.
+
+        Returns:
+            InceptionResnetV1 -- The model itself.
+        """
+        return self._to_reduced_precision(torch.bfloat16)
+
+    def to_half(self):
+        """Convert the model to float16, keeping the embedding head in float32.
+
+        See `to_bfloat16`, which is numerically safer where supported.
+
+        Returns:
+            InceptionResnetV1 -- The model itself.
+        """
+        return self._to_reduced_precision(torch.float16)
+
+    def _to_reduced_precision(self, dtype):
+        self.to(dtype=dtype)
+        # The final projection and its batch norm determine the embedding; keep them in float32
+        for name in ("last_linear", "last_bn", "logits"):
+            if hasattr(self, name):
+                getattr(self, name).float()
+        self._reduced_dtype = dtype
+        return self
+
+    def fuse_for_inference(self):
+        """Fold all convolutional batch norm layers into their preceding convolutions.
+
+        This removes one kernel launch and one full read/write of the activations per
+        BasicConv2d. The model must be in eval mode, and the fused model should not be trained
+        further. Note that the state_dict of a fused model no longer matches the pretrained
+        checkpoints.
+
+        Returns:
+            InceptionResnetV1 -- The fused model (modified in place).
+        """
+        for module in list(self.modules()):
+            if isinstance(module, BasicConv2d):
+                module._fuse_for_inference()
+        self.release_graph()
+        return self
+
+    def set_branch_streams(self, enabled=True):
+        """Run the independent branches of Mixed_6a and Mixed_7a on separate CUDA streams.
+
+        At small batch sizes a single branch is too small to fill the GPU, so running branches
+        concurrently improves utilization. Has no effect on the computed outputs. The streams are
+        dropped when the model is moved to another device.
+
+        Keyword Arguments:
+            enabled {bool} -- Whether to enable or disable branch streams. (default: {True})
+
+        Returns:
+            InceptionResnetV1 -- The model itself.
+        """
+        streams = None
+        if enabled:
+            if torch.device(self.device).type != "cuda":
+                raise ValueError("Branch streams require the model to be on a CUDA device")
+            streams = [torch.cuda.Stream(self.device) for _ in range(4)]
+        for module in self.modules():
+            if isinstance(module, (Mixed_6a, Mixed_7a)):
+                module.branch_streams = streams
+        return self
+
+    def set_cat_buffers(self, enabled=True):
+        """Reuse a per-block output buffer for the branch concatenation in Block35/17/8.
+
+        When gradients are disabled, each block concatenates its branches into a buffer that is
+        allocated once per input shape instead of into a fresh tensor on every call. The buffers
+        are shared between calls, so a model with buffers enabled must not run several forward
+        passes concurrently (e.g. from multiple threads). Captured CUDA graphs do not use the
+        buffers, and any existing graph is released.
+
+        Keyword Arguments:
+            enabled {bool} -- Whether to enable or disable buffer reuse. (default: {True})
+
+        Returns:
+            InceptionResnetV1 -- The model itself.
+        """
+        for module in self.modules():
+            if isinstance(module, (Block35, Block17, Block8)):
+                module.reuse_cat_buffer = enabled
+                module._cat_buffer = None
+        self.release_graph()
+        return self
+
+    def capture_graph(self, example_input):
+        """Capture the forward pass into a CUDA graph for fixed-shape inference.
+
+        At small batch sizes inference is dominated by Python and kernel launch overhead; replaying
+        a captured graph launches the whole network at once. Later calls in eval mode with an input
+        of the same shape, dtype and device replay the graph, and their outputs do not track
+        gradients. Other inputs use the regular forward pass. The graph is released when the model
+        is moved, cast or fused, or by calling `release_graph`. The graph holds the addresses of
+        the current weights, so submodules must not be replaced or modified in place while it is
+        held.
+
+        Arguments:
+            example_input {torch.tensor} -- Batch of image tensors with the shape to capture.
+
+        Returns:
+            InceptionResnetV1 -- The model itself.
+        """
+        if self.training:
+            raise RuntimeError("CUDA graphs can only be captured in eval mode")
+        if not example_input.is_cuda:
+            raise ValueError("CUDA graphs require a CUDA input tensor")
+        self.release_graph()
+
+        static_input = example_input.detach().clone()
+        current = torch.cuda.current_stream(static_input.device)
+        with torch.no_grad():
+            # Warm up on a side stream so that cuDNN autotuning happens outside of the capture
+            stream = torch.cuda.Stream(static_input.device)
+            stream.wait_stream(current)
+            with torch.cuda.stream(stream):
+                for _ in range(3):
+                    self._forward(static_input)
+            current.wait_stream(stream)
+
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                static_output = self._forward(static_input)
+
+        self._graph = graph
+        self._static_input = static_input
+        self._static_output = static_output
+        return self
+
+    def release_graph(self):
+        """Drop the CUDA graph captured by `capture_graph`, if any."""
+        self._graph = None
+        self._static_input = None
+        self._static_output = None
+
+    def quantize(self, calib_loader, backend="x86"):
+        """Create a post-training static INT8 quantized copy of the model for CPU inference.
+
+        Conv+BN+ReLU sequences are fused and quantized, with activation ranges observed by running
+        the batches of `calib_loader` through the model. The final linear, batch norm and logits
+        layers are kept in FP32 for accuracy of the embeddings. The model itself is unchanged and
+        must be on the CPU.
+
+        Arguments:
+            calib_loader {iterable} -- Calibration batches of image tensors, or (images, labels)
+                tuples such as those produced by a DataLoader.
+
+        Keyword Arguments:
+            backend {str} -- Quantization backend, 'x86' for server CPUs or 'qnnpack' for ARM.
+                `torch.backends.quantized.engine` must match it when running the quantized model.
+                (default: {'x86'})
+
+        Returns:
+            torch.fx.GraphModule -- The quantized model.
+
+        Raises:
+            ValueError: If the model is not on the CPU or `calib_loader` is empty.
+        """
+        # Imported here so that importing the package does not pay for the quantization stack
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if any(p.device.type != "cpu" for p in self.parameters()):
+            raise ValueError("Quantization requires the model to be on the CPU")
+
+        batches = (b[0] if isinstance(b, (list, tuple)) else b for b in calib_loader)
+        first = next(batches, None)
+        if first is None:
+            raise ValueError("calib_loader must yield at least one batch")
+
+        qconfig_mapping = get_default_qconfig_mapping(backend)
+        for name in ("last_linear", "last_bn", "logits"):
+            qconfig_mapping.set_module_name(name, None)
+
+        global _fx_tracing
+        _fx_tracing = True
+        try:
+            model = prepare_fx(copy.deepcopy(self).eval(), qconfig_mapping, (first,))
+        finally:
+            _fx_tracing = False
+        with torch.no_grad():
+            for x in itertools.chain([first], batches):
+                model(x)
+        return convert_fx(model)
+
+    def _graph_matches(self, x):
+        return (
+            not self.training
+            and x.shape == self._static_input.shape
+            and x.dtype == self._static_input.dtype
+            and x.device == self._static_input.device
+        )
+
+    def preprocess_async(self, x):
+        """Start copying a batch of image tensors from host memory to the model's device.
+
+        The batch is pinned and copied on a dedicated CUDA stream, so the transfer overlaps with
+        work already queued on the compute stream; `forward` waits for the copy before using it.
+        In a pipeline, queue the next batch's copy right after launching the current batch:
+
+            x = resnet.preprocess_async(batches[0])
+            for i in range(len(batches)):
+                embeddings = resnet(x)
+                if i + 1 < len(batches):
+                    x = resnet.preprocess_async(batches[i + 1])
+
+        On CPU models, or for tensors already on a CUDA device, this is a plain `.to(device)`.
+
+        Arguments:
+            x {torch.tensor} -- Batch of image tensors.
+
+        Returns:
+            torch.tensor -- The batch on the model's device (the copy may still be in flight).
+        """
+        device = torch.device(self.device)
+        if device.type != "cuda" or x.is_cuda:
+            return x.to(device)
+        if self._copy_stream is None:
+            self._copy_stream = torch.cuda.Stream(device)
+        if not x.is_pinned():
+            x = x.pin_memory()
+        with torch.cuda.stream(self._copy_stream):
+            x = x.to(device, non_blocking=True)
+        # Allocated on the copy stream but consumed on the compute stream
+        x.record_stream(torch.cuda.current_stream(device))
+        return x
+
+    def _apply(self, fn, *args, **kwargs):
+        # Moving or casting parameters invalidates the memory addresses baked into a CUDA graph
+        self.release_graph()
+        param = next(self.parameters(), None)
+        old_device = param.device if param is not None else None
+        module = super()._apply(fn, *args, **kwargs)
+        param = next(self.parameters(), None)
+        if param is not None and param.device != old_device:
+            # Streams belong to the old device; let any in-flight input copy finish first
+            if self._copy_stream is not None:
+                torch.cuda.current_stream(old_device).wait_stream(self._copy_stream)
+                self._copy_stream = None
+            for m in self.modules():
+                if isinstance(m, (Mixed_6a, Mixed_7a)):
+                    m.branch_streams = None
+        # A cast of the whole model (e.g. .float()) ends mixed precision mode
+        if self._reduced_dtype is not None and self.conv2d_1a.conv.weight.dtype != self._reduced_dtype:
+            self._reduced_dtype = None
+        # Keep `device` in sync when the model is moved with .to()/.cuda()/.cpu()
+        if param is not None:
+            self.device = param.device
+        return module
+
 
 def load_weights(mdl, name):
     """Download pretrained state_dict and load into model.
@@ -320,9 +802,7 @@ def load_weights(mdl, name):
     elif name == "casia-webface":
         path = "https://github.com/timesler/facenet-pytorch/releases/download/v2.2.9/20180408-102900-casia-webface.pt"
     elif name.endswith(".pt"):
-        path = name
-        state_dict = torch.load(path)
-        mdl.load_state_dict(state_dict)
+        _load_state_dict(mdl, name)
         return
     else:
         raise ValueError(
@@ -336,8 +816,16 @@ def load_weights(mdl, name):
     if not os.path.exists(cached_file):
         download_url_to_file(path, cached_file)
 
-    state_dict = torch.load(cached_file, weights_only=True)
-    mdl.load_state_dict(state_dict, strict=False)
+    _load_state_dict(mdl, cached_file, strict=False)
+
+
+def _load_state_dict(mdl, path, strict=True):
+    # Memory-mapping lets the OS page the weights in on demand rather than reading the whole file
+    # up front; it is only supported for checkpoints in the zipfile format. load_state_dict copies
+    # into the model's existing tensors, so nothing stays backed by the file and the parameters
+    # keep their identity and memory format
+    state_dict = torch.load(path, map_location="cpu", weights_only=True, mmap=zipfile.is_zipfile(path))
+    mdl.load_state_dict(state_dict, strict=strict)
 
 
 def get_torch_home():
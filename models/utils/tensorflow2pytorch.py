@@ -1,4 +1,5 @@
 import tensorflow as tf
+import numpy as np
 import torch
 import json
 import os, sys
@@ -119,6 +120,17 @@ def load_tf_basicConv2d(weights, layer):
     load_tf_batchNorm(weights[1:], layer.bn)
 
 
+def load_tf_basicConv2d_merged(weights, layer):
+    """Load several sets of tensorflow weights into one channel-concatenated Conv2d+BatchNorm.
+    
+    Arguments:
+        weights {list} -- List of tensorflow parameter lists, one per original layer.
+        layer {torch.nn.Module} -- Object containing Conv2d+BatchNorm.
+    """
+    load_tf_conv2d(np.concatenate([w[0] for w in weights], axis=-1), layer.conv)
+    load_tf_batchNorm([np.concatenate([w[i] for w in weights]) for i in range(1, 4)], layer.bn)
+
+
 def load_tf_linear(weights, layer):
     """Load tensorflow weights into nn.Linear object.
     
@@ -143,20 +155,16 @@ def load_tf_linear(weights, layer):
 # High-level parameter-loading functions:
 
 def load_tf_block35(weights, layer):
-    load_tf_basicConv2d(weights[:4], layer.branch0)
-    load_tf_basicConv2d(weights[4:8], layer.branch1[0])
-    load_tf_basicConv2d(weights[8:12], layer.branch1[1])
-    load_tf_basicConv2d(weights[12:16], layer.branch2[0])
-    load_tf_basicConv2d(weights[16:20], layer.branch2[1])
-    load_tf_basicConv2d(weights[20:24], layer.branch2[2])
+    load_tf_basicConv2d_merged([weights[:4], weights[4:8], weights[12:16]], layer.branch_1x1)
+    load_tf_basicConv2d_merged([weights[8:12], weights[16:20]], layer.branch_3x3)
+    load_tf_basicConv2d(weights[20:24], layer.branch2_3x3)
     load_tf_conv2d(weights[24:26], layer.conv2d)
 
 
 def load_tf_block17_8(weights, layer):
-    load_tf_basicConv2d(weights[:4], layer.branch0)
-    load_tf_basicConv2d(weights[4:8], layer.branch1[0])
-    load_tf_basicConv2d(weights[8:12], layer.branch1[1])
-    load_tf_basicConv2d(weights[12:16], layer.branch1[2])
+    load_tf_basicConv2d_merged([weights[:4], weights[4:8]], layer.branch_1x1)
+    load_tf_basicConv2d(weights[8:12], layer.branch1[0])
+    load_tf_basicConv2d(weights[12:16], layer.branch1[1])
     load_tf_conv2d(weights[16:18], layer.conv2d)
 
 
@@ -12,6 +12,7 @@ import pandas as pd
 from time import time
 import sys, os
 import glob
+import copy
 
 from models.mtcnn import MTCNN, fixed_image_standardization
 from models.inception_resnet_v1 import InceptionResnetV1, get_torch_home
@@ -148,6 +149,34 @@ for i, ds in enumerate(['vggface2', 'casia-webface']):
         assert total_error < 1e-2
         assert total_error_fromfile < 1e-2
 
+    # Batched embedding API should match a single forward pass
+    embs_batch = torch.stack(resnet_pt.embed_batch(list(aligned), batch_size=2))
+    assert (embs_batch - embs).norm() < 1e-4
+
+    # Reusing concat buffers should not change the embeddings, including across batch sizes
+    resnet_buf = copy.deepcopy(resnet_pt).set_cat_buffers()
+    with torch.no_grad():
+        assert (resnet_buf(aligned) - embs).norm() < 1e-4
+        assert (resnet_buf(aligned[:2]) - embs[:2]).norm() < 1e-4
+    with torch.inference_mode():
+        assert (resnet_buf(aligned) - embs).norm() < 1e-4
+    resnet_buf.set_cat_buffers(False)
+    with torch.no_grad():
+        assert (resnet_buf(aligned[:3]) - embs[:3]).norm() < 1e-4
+
+    # Conv/BN fusion should not change the embeddings
+    embs_fused = copy.deepcopy(resnet_pt).fuse_for_inference()(aligned)
+    assert (embs_fused - embs).norm() < 1e-3
+
+    # INT8 quantized embeddings should stay close to the FP32 ones
+    resnet_q = InceptionResnetV1(pretrained=ds).eval().quantize([aligned])
+    embs_q = resnet_q(aligned)
+    assert ((embs_q * embs).sum(dim=1) > 0.99).all()
+
+    # bfloat16 body with a float32 head should stay close to the float32 embeddings
+    embs_bf16 = copy.deepcopy(resnet_pt).to_bfloat16()(aligned)
+    assert ((embs_bf16 * embs).sum(dim=1) > 0.99).all()
+
 
 #### TEST CLASSIFICATION ####
 